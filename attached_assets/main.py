@@ -1,11 +1,31 @@
+import io
 import os
 import re
 import asyncio
+import functools
+import hashlib
+from collections import OrderedDict
 from dotenv import load_dotenv
 from telethon import TelegramClient, events
-from telethon.tl.functions.channels import JoinChannelRequest
+from telethon.errors import FileReferenceExpiredError, FloodWaitError, MediaEmptyError
+from telethon.tl.functions.channels import GetChannelsRequest, JoinChannelRequest
 import google.generativeai as genai
 
+_UI_KW_ASCII = ('ui', 'ux', 'interface', 'figma')
+_UI_KW_FA = ('فرانت', 'طراحی رابط')
+_USER_RE = re.compile(r'@[\w_]+')
+_GEMINI_MODEL = None
+# محدود کردن درخواست‌های هم‌زمان به Gemini و ارسال‌ها برای جلوگیری از 429 و FloodWait
+_GEMINI_SEM = asyncio.Semaphore(5)
+_SEND_SEM = asyncio.Semaphore(3)
+# پیام‌های تولیدشده برای آگهی‌های تکراری (کلید: هش متن آگهی)
+_GENERATED_CACHE = OrderedDict()
+_GENERATED_CACHE_SIZE = 512
+# فایل رزومه‌ی آپلودشده (و پس از اولین ارسال، سند ذخیره‌شده در تلگرام)
+_CV_MEDIA = None
+# حداکثر طول کپشن فایل در تلگرام
+_CAPTION_LIMIT = 1024
+
 
 def load_env_config():
     load_dotenv()
@@ -48,18 +68,34 @@ def connect_telegram(api_id, api_hash, proxy_settings=None):
 
 
 def contains_ui_keywords(text):
-    keywords = ['UI', 'UX', 'interface', 'figma', 'فرانت', 'طراحی رابط']
-    return any(k.lower() in text.lower() for k in keywords)
+    # Plain substring checks are cheaper than a regex on the common non-matching case
+    lowered = text.lower()
+    return any(k in lowered for k in _UI_KW_ASCII) or any(k in text for k in _UI_KW_FA)
 
 
 def extract_username(text):
-    match = re.search(r'@[\w\d_]+', text)
+    match = _USER_RE.search(text)
     return match.group(0) if match else None
 
 
+def _get_model(api_key):
+    # genai.configure و ساخت مدل فقط یک بار انجام می‌شود
+    global _GEMINI_MODEL
+    if _GEMINI_MODEL is None:
+        genai.configure(api_key=api_key)
+        _GEMINI_MODEL = genai.GenerativeModel('gemini-pro')
+    return _GEMINI_MODEL
+
+
 async def generate_custom_message(text, api_key):
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-pro')
+    # آگهی‌هایی که در چند کانال تکرار می‌شوند دوباره به Gemini ارسال نمی‌شوند
+    key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+    cached = _GENERATED_CACHE.get(key)
+    if cached is not None:
+        _GENERATED_CACHE.move_to_end(key)
+        return cached
+
+    model = _get_model(api_key)
 
     prompt = f"""با توجه به آگهی زیر، یک پیام حرفه‌ای، مودبانه و دوستانه به زبان فارسی برای اعلام آمادگی و ارسال پیشنهاد همکاری بنویس. در پیام حتما به صورت خلاصه به تجربه مرتبط خودت اشاره کن و اشتیاقت رو برای همکاری نشون بده. پیام نباید خیلی طولانی باشه و بهتره با یک ایموجی مناسب شروع بشه و با یک ایموجی مناسب تموم بشه.
 
@@ -68,59 +104,129 @@ async def generate_custom_message(text, api_key):
 """
 
     try:
-        response = await model.generate_content_async(prompt)
+        async with _GEMINI_SEM:
+            response = await model.generate_content_async(prompt)
+        _GENERATED_CACHE[key] = response.text
+        if len(_GENERATED_CACHE) > _GENERATED_CACHE_SIZE:
+            _GENERATED_CACHE.popitem(last=False)
         return response.text
     except Exception as e:
         print(f"خطا در ارتباط با Gemini API: {e}")
         return "متاسفانه در حال حاضر امکان تولید پیام خودکار وجود ندارد. لطفا بعدا تلاش کنید."
 
 
+@functools.lru_cache(maxsize=None)
+def _load_cv(cv_filename):
+    """
+    خواندن فایل رزومه فقط یک بار؛ در صورت نبود فایل None برمی‌گرداند
+    """
+    cv_path = os.path.join(os.path.dirname(__file__), cv_filename)
+    if not os.path.exists(cv_path):
+        return cv_path, None
+    with open(cv_path, 'rb') as f:
+        return cv_path, f.read()
+
+
+async def upload_cv(client, cv_filename="javad-rostami resume.pdf"):
+    """
+    آپلود یک‌باره‌ی رزومه تا برای همه‌ی گیرنده‌ها استفاده شود
+    """
+    global _CV_MEDIA
+    cv_path, cv_bytes = _load_cv(cv_filename)
+    if cv_bytes is None:
+        return
+    try:
+        _CV_MEDIA = await client.upload_file(cv_bytes, file_name="resume.pdf")
+    except Exception as e:
+        print(f"خطا در آپلود فایل رزومه: {e}")
+
+
 async def send_message_to_user(client, username, message, portfolio_url, cv_filename="javad-rostami resume.pdf"):
+    global _CV_MEDIA
     entity = await client.get_entity(username)
 
-    # ارسال پیام متنی
-    await client.send_message(entity, message)
+    async with _SEND_SEM:
+        cv_path, cv_bytes = _load_cv(cv_filename)
+        if cv_bytes is None:
+            print(f"فایل رزومه در مسیر {cv_path} یافت نشد.")
+            await client.send_message(entity, f"{message}\n\n(فایل رزومه یافت نشد. لینک نمونه کار: {portfolio_url})")
+            return
+
+        # پیام متنی به عنوان کپشن فایل رزومه ارسال می‌شود تا یک درخواست کافی باشد
+        caption = f"{message}\n\nنمونه‌کار: {portfolio_url}"
+        if len(caption) > _CAPTION_LIMIT:
+            await client.send_message(entity, message)
+            message = None
+            caption = f"فایل رزومه اینجانب.\nنمونه‌کار: {portfolio_url}"
 
-    # ارسال فایل رزومه
-    cv_path = os.path.join(os.path.dirname(__file__), cv_filename)
-    if os.path.exists(cv_path):
         try:
-            await client.send_file(entity, cv_path, caption=f"فایل رزومه اینجانب.\nنمونه‌کار: {portfolio_url}")
+            cv_file = _CV_MEDIA
+            if cv_file is None:
+                cv_file = io.BytesIO(cv_bytes)
+                cv_file.name = "resume.pdf"
+            sent = await client.send_file(entity, cv_file, caption=caption, force_document=True)
+            # ارسال‌های بعدی به سند ذخیره‌شده ارجاع می‌دهند و دوباره آپلود نمی‌شوند
+            if sent.document:
+                _CV_MEDIA = sent.document
             print(f"رزومه با موفقیت برای {username} ارسال شد.")
+        except FloodWaitError as e:
+            # ارسال متن جایگزین در همان بازه‌ی محدودیت هم رد می‌شود؛ خطا به فراخواننده داده می‌شود
+            print(f"محدودیت ارسال ({e.seconds} ثانیه) هنگام ارسال رزومه به {username}")
+            raise
         except Exception as e:
             print(f"خطا در ارسال فایل رزومه به {username}: {e}")
-            await client.send_message(entity, f"(خطا در ارسال فایل رزومه. لینک نمونه کار: {portfolio_url})")
-    else:
-        print(f"فایل رزومه در مسیر {cv_path} یافت نشد.")
-        await client.send_message(entity, f"(فایل رزومه یافت نشد. لینک نمونه کار: {portfolio_url})")
+            if isinstance(e, (FileReferenceExpiredError, MediaEmptyError)):
+                # فقط در صورت نامعتبر شدن فایل ذخیره‌شده، دفعه‌ی بعد دوباره آپلود می‌شود
+                _CV_MEDIA = None
+            fallback = f"(خطا در ارسال فایل رزومه. لینک نمونه کار: {portfolio_url})"
+            if message:
+                fallback = f"{message}\n\n{fallback}"
+            await client.send_message(entity, fallback)
 
 
 async def fetch_channels(client, channels):
     """
     عضویت در کانال‌ها و بازگرداندن entityهای آن‌ها
     """
+    sem = asyncio.Semaphore(5)
+
+    async def _join(ch):
+        async with sem:
+            try:
+                await client(JoinChannelRequest(ch))
+            except Exception:
+                pass
+
+    targets = [ch for ch in channels if ch.strip()]
+    await asyncio.gather(*[_join(ch) for ch in targets])
+
+    # دریافت همه‌ی کانال‌ها با یک درخواست؛ در صورت خطا هر کانال جداگانه دریافت می‌شود
+    try:
+        result = await client(GetChannelsRequest(id=targets))
+        return result.chats
+    except Exception as e:
+        print(f"خطا در دریافت گروهی کانال‌ها: {e}")
+
     entities = []
-    for ch in channels:
-        try:
-            await client(JoinChannelRequest(ch))
-        except Exception:
-            pass
+    for ch in targets:
         try:
-            entity = await client.get_entity(ch)
-            entities.append(entity)
+            entities.append(await client.get_entity(ch))
         except Exception as e:
             print(f"خطا در دریافت یا عضویت کانال {ch}: {e}")
     return entities
 
 
-async def process_new_message(event, client, config):
+async def process_new_message(text, client, gemini_api_key, portfolio_url):
     """پردازش پیام جدید: فیلتر کلیدواژه، استخراج یوزرنیم، تولید و ارسال پاسخ"""
-    text = event.message.message
-    if contains_ui_keywords(text):
-        username = extract_username(text)
-        if username:
-            msg = await generate_custom_message(text, config['gemini_api_key'])
-            await send_message_to_user(client, username, msg, config['portfolio_url'])
+    text = text or ''
+    # پیام‌های خالی (استیکر، عکس بدون کپشن) یا خیلی کوتاه بدون هیچ پردازشی رد می‌شوند
+    if len(text) < 10:
+        return
+    # فیلتر کلیدواژه توسط pattern هندلر (contains_ui_keywords) انجام شده است
+    username = extract_username(text)
+    if username:
+        msg = await generate_custom_message(text, gemini_api_key)
+        await send_message_to_user(client, username, msg, portfolio_url)
 
 
 async def main():
@@ -134,11 +240,17 @@ async def main():
 
     # شروع جلسه و عضویت در کانال‌ها
     await client.start()
+    await upload_cv(client)
     channel_entities = await fetch_channels(client, config['channels'])
 
-    @client.on(events.NewMessage(chats=channel_entities))
+    # مقادیر ثابت یک بار خوانده می‌شوند و در closure هندلر باقی می‌مانند
+    gemini_api_key = config['gemini_api_key']
+    portfolio_url = config['portfolio_url']
+
+    # Telethon پیام‌های بدون کلیدواژه را پیش از فراخوانی هندلر کنار می‌گذارد
+    @client.on(events.NewMessage(chats=channel_entities, pattern=contains_ui_keywords))
     async def handler(event):
-        await process_new_message(event, client, config)
+        await process_new_message(event.raw_text, client, gemini_api_key, portfolio_url)
 
     print("Bot is running...")
     await client.run_until_disconnected()
@@ -0,0 +1,11 @@
+import os
+import functools
+from types import MappingProxyType
+from typing import Mapping
+from dotenv import load_dotenv
+
+@functools.lru_cache(maxsize=1)
+def get_config() -> Mapping[str, str]:
+    """Load the .env file once and return a read-only snapshot of the environment"""
+    load_dotenv()
+    return MappingProxyType(dict(os.environ))
@@ -1,6 +1,7 @@
-import os
 import logging
+import functools
 from typing import Dict, List, Any
+from config import get_config
 
 logger = logging.getLogger(__name__)
 
@@ -21,16 +22,18 @@ class ConfigValidator:
         'PROXY_SERVER': str,
         'PROXY_PORT': int,
         'PROXY_SECRET': str,
-        'RESUME_FILENAME': str
+        'RESUME_FILENAME': str,
+        'TG_STRING_SESSION': str
     }
     
     def validate_config(self) -> Dict[str, Any]:
         """Validate and return configuration dictionary"""
         config = {}
+        env = get_config()
         
         # Validate required variables
         for var_name, var_type in self.REQUIRED_VARS.items():
-            value = os.getenv(var_name)
+            value = env.get(var_name)
             if not value:
                 raise ValueError(f"Required environment variable {var_name} is missing")
             
@@ -44,14 +47,14 @@ class ConfigValidator:
         
         # Process channels
         channels = config['channels'].split(',')
-        config['channels'] = [ch.strip() for ch in channels if ch.strip()]
+        config['channels'] = tuple(ch.strip() for ch in channels if ch.strip())
         
         if not config['channels']:
             raise ValueError("No valid channels found in CHANNELS environment variable")
         
         # Validate optional variables
         for var_name, var_type in self.OPTIONAL_VARS.items():
-            value = os.getenv(var_name)
+            value = env.get(var_name)
             if value:
                 try:
                     if var_type == int:
@@ -116,3 +119,9 @@ class ConfigValidator:
         logger.info(f"Portfolio URL: {'Set' if config.get('portfolio_url') else 'Not set'}")
         logger.info(f"Resume file: {config.get('resume_filename', 'Not specified')}")
         logger.info("==============================")
+
+
+@functools.lru_cache(maxsize=1)
+def get_validated_config() -> Dict[str, Any]:
+    """Validate the configuration once and return the same dict on later calls"""
+    return ConfigValidator().validate_config()
@@ -0,0 +1,35 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, TypeVar
+from telethon.errors import FloodWaitError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Waits shorter than this are routine and only logged at debug level
+FLOOD_WAIT_LOG_THRESHOLD = 10
+
+async def call_with_flood_retry(coro_factory: Callable[[], Awaitable[T]],
+                                max_retries: int = 5, max_wait: int = 600) -> T:
+    """Await coro_factory(), sleeping through FloodWaitError up to max_retries times.
+
+    The wait Telegram asks for is clamped to [0, max_wait] so a bogus or
+    hours-long value neither spins nor locks the bot out. After max_retries
+    consecutive flood waits the last FloodWaitError is re-raised.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await coro_factory()
+        except FloodWaitError as e:
+            attempt += 1
+            if attempt > max_retries:
+                logger.error("Giving up after %d flood waits", max_retries)
+                raise
+            wait = max(0, min(e.seconds, max_wait))
+            level = logging.DEBUG if wait < FLOOD_WAIT_LOG_THRESHOLD else logging.WARNING
+            logger.log(level, "Flood wait of %ss on %s (sleeping %ss, retry %d/%d)",
+                       e.seconds, e.request.__class__.__name__ if e.request else 'request',
+                       wait, attempt, max_retries)
+            await asyncio.sleep(wait)
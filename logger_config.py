@@ -5,6 +5,11 @@ from datetime import datetime
 def setup_logger(name: str = 'telegram_ui_bot', level: str = 'INFO') -> logging.Logger:
     """Setup and configure logger for the application"""
     
+    # Skip per-record thread/process bookkeeping that the log format never uses
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    
     # Create logger
     logger = logging.getLogger(name)
     logger.setLevel(getattr(logging, level.upper()))
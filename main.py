@@ -1,25 +1,58 @@
-import os
 import asyncio
+import json
 import logging
-from dotenv import load_dotenv
-from telethon import TelegramClient, events
-from telethon.errors import FloodWaitError, SessionPasswordNeededError, rpcerrorlist
-from telethon.errors import PhoneCodeEmptyError, PhoneCodeExpiredError, PasswordHashInvalidError
-from telethon.tl.functions.channels import JoinChannelRequest
-from flask_app import run_flask_app
+import os
+import time
+
+# Prefer uvloop's libuv-based event loop when it is installed. This runs before
+# any client is created so Telethon and python-telegram-bot both use it.
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    uvloop = None
+
+from telethon import events, utils
+from telethon.errors import SessionPasswordNeededError, UnauthorizedError
+from telethon.tl.functions.channels import GetChannelsRequest, JoinChannelRequest
+from telethon.tl.types import InputPeerChannel
+from webhook_app import create_webhook_server
+from flood_control import call_with_flood_retry
 from telegram import Bot as TgBot
+from telegram.request import HTTPXRequest
 
-from config_validator import ConfigValidator
+from config import get_config
+from config_validator import get_validated_config
 from session_handler import SessionHandler
 from message_processor import MessageProcessor
 from logger_config import setup_logger
-from ui_bot_handler import get_phone_number_from_bot, get_code_from_bot
+from ui_bot_handler import (
+    ALLOWED_CHAT_ID_INT, AuthInputTimeout, BOT_TOKEN, CHAT_ID,
+    close_bot, get_phone_number_from_bot, get_code_from_bot, send_telegram_message,
+)
 import signal
 
 # Setup logging
 logger = setup_logger()
+if uvloop is not None:
+    logger.info("Using uvloop event loop")
+
+# Public webhook endpoint, tolerant of a trailing slash in RENDER_EXTERNAL_URL
+_render_url = get_config().get("RENDER_EXTERNAL_URL")
+WEBHOOK_URL = f"{_render_url.rstrip('/')}/webhook" if _render_url else None
 
 class TelegramUIBot:
+    # Incoming events are flushed to the processor in batches of at most
+    # MAX_BATCH_SIZE, or after BATCH_INTERVAL seconds, whichever comes first
+    MAX_BATCH_SIZE = 20
+    BATCH_INTERVAL = 0.5
+    # Joined channels are remembered (per account, in
+    # SessionHandler.entities_cache_file) so restarts within the TTL skip
+    # resolving and joining them again
+    ENTITIES_CACHE_TTL = 24 * 60 * 60
+    # Maximum number of batches processed concurrently
+    MAX_INFLIGHT = 10
+
     def __init__(self):
         self.config = None
         self.client = None
@@ -27,21 +60,25 @@ class TelegramUIBot:
         self.message_processor = None
         self.channel_entities = []
         self.is_running = False
-        # Flag to manage auth process status
-        self._auth_in_progress = False
+        self._event_q = asyncio.Queue()
+        self._batch_task = None
+        self._pending = set()
+        self._shutdown_event = asyncio.Event()
+        # Phone number entered via the UI bot, reused if the client has to start again
+        self._cached_phone = None
         
     async def initialize(self):
         """Initialize the bot with configuration and validation"""
         try:
             # Load and validate configuration
-            load_dotenv()
-            validator = ConfigValidator()
-            self.config = validator.validate_config()
+            self.config = get_validated_config()
             logger.info("Configuration loaded and validated successfully")
 
             # Check for essential config for UI bot interaction
-            if not os.getenv('BOT_TOKEN') or not os.getenv('CHAT_ID'):
+            if not BOT_TOKEN or not CHAT_ID:
                  logger.error("BOT_TOKEN or CHAT_ID not set in environment variables. UI bot interaction will not work.")
+            elif ALLOWED_CHAT_ID_INT is None:
+                 logger.error(f"CHAT_ID {CHAT_ID!r} is not a numeric chat id. UI bot replies will be ignored.")
                  # Decide how to proceed if UI bot is essential - maybe raise an error?
                  # For now, log and continue, but auth may fail without UI bot.
 
@@ -66,65 +103,171 @@ class TelegramUIBot:
     # async def setup_auth_handlers(self):
     #     ...
 
-    async def authenticate(self):
-        """Handles the Telethon authentication flow interactively via UI bot."""
-        self._auth_in_progress = True
+    async def _get_phone(self):
+        """Ask for the phone number via the UI bot once and reuse it afterwards.
+
+        Only a number Telethon can parse is cached; client.start() calls this
+        again until it gets one, so an invalid reply must trigger a new prompt.
+        """
+        if self._cached_phone is None:
+            phone = await get_phone_number_from_bot()
+            if not utils.parse_phone(phone):
+                logger.warning("Invalid phone number received from UI bot, asking again")
+                return phone
+            self._cached_phone = phone
+        return self._cached_phone
+
+    async def _resolve_one(self, channel, sem: asyncio.Semaphore):
+        """Resolve a channel to an input peer, from the session cache when possible"""
+        async def resolve():
+            try:
+                # Uncached usernames cost a ResolveUsername request here
+                return await self.client.get_input_entity(channel)
+            except ValueError:
+                return await self.client.get_entity(channel)
+
+        async with sem:
+            return await call_with_flood_retry(resolve)
+
+    async def _fetch_channels(self, peers: dict) -> dict:
+        """Fetch full channel objects for all resolved peers in one request"""
+        by_id = {}
         try:
-            # Connect the Telegram client using existing session or raw connection
-            await self.client.connect()
-            logger.info("Telethon client connected.")
-
-            # If not authorized, start interactive phone+code login
-            if not await self.client.is_user_authorized():
-                logger.info("Client is not authorized. Starting interactive authentication.")
-                phone_number = await get_phone_number_from_bot()
-                await self.client.send_code_request(phone_number)
-                logger.info("Phone code request sent. Waiting for code via UI bot...")
-                code = await get_code_from_bot()
-                # Sign in with the received code
-                await self.client.sign_in(phone=phone_number, code=code)
-                logger.info("Signed in with phone and code.")
-
-            # Final authorization check
-            if await self.client.is_user_authorized():
-                logger.info("User successfully authorized.")
-                return True
-            else:
-                logger.error("Authentication failed. Client still not authorized.")
-                return False
-        except SessionPasswordNeededError:
-            logger.error("Two-factor authentication is enabled but not implemented in UI bot. Please disable 2FA or implement password flow.")
-            return False
+            result = await call_with_flood_retry(
+                lambda: self.client(GetChannelsRequest(id=list(peers.values())))
+            )
+            by_id = {chat.id: chat for chat in result.chats}
+        except UnauthorizedError:
+            raise
         except Exception as e:
-            logger.error(f"Error during authentication process: {e}")
-            return False
-        finally:
-            self._auth_in_progress = False
+            logger.warning("Batch channel lookup failed, resolving individually: %s", e)
 
-    async def join_channels(self):
-        """Join all configured channels and return their entities"""
-        entities = []
-        for channel in self.config['channels']:
-            if not channel.strip():
-                continue
-                
-            try:
-                # Try to join the channel first
+        entities = {}
+        for channel, peer in peers.items():
+            entity = by_id.get(getattr(peer, 'channel_id', None))
+            if entity is None:
+                # Missing from the batch response (or not a channel); look it up on its own
                 try:
-                    await self.client(JoinChannelRequest(channel))
-                    logger.info(f"Successfully joined channel: {channel}")
-                except Exception as join_error:
-                    logger.warning(f"Could not join channel {channel}: {join_error}")
-                
-                # Get channel entity
-                entity = await self.client.get_entity(channel)
-                entities.append(entity)
-                logger.info(f"Added channel entity: {channel}")
-                
-            except Exception as e:
-                logger.error(f"Failed to process channel {channel}: {e}")
-                
+                    entity = await call_with_flood_retry(lambda: self.client.get_entity(peer))
+                except Exception as e:
+                    logger.error("Failed to process channel %s: %s", channel, e)
+                    continue
+            entities[channel] = entity
         return entities
+
+    async def _share_string_session(self):
+        """Send the new session to the operator so it can be set as TG_STRING_SESSION"""
+        if not BOT_TOKEN or not CHAT_ID:
+            return
+        session_string = self.session_handler.export_string_session(self.client)
+        await send_telegram_message(
+            BOT_TOKEN, CHAT_ID,
+            "ورود انجام شد. برای جلوگیری از ورود مجدد پس از هر استقرار، مقدار زیر را "
+            "در متغیر محیطی TG_STRING_SESSION قرار دهید (این مقدار را با کسی به اشتراک نگذارید):\n\n"
+            + session_string
+        )
+        logger.info("String session sent to the UI bot chat")
+
+    async def _join_one(self, channel, entity, sem: asyncio.Semaphore):
+        """Join a single, already resolved channel"""
+        async with sem:
+            try:
+                await call_with_flood_retry(lambda: self.client(JoinChannelRequest(entity)))
+                logger.info("Successfully joined channel: %s", channel)
+            except Exception as join_error:
+                logger.warning("Could not join channel %s: %s", channel, join_error)
+                return False
+
+            logger.info("Added channel entity: %s", channel)
+            return True
+
+    def _read_entity_cache(self, owner_id: int) -> dict:
+        """Return the raw cache entries, or nothing if they belong to another account"""
+        try:
+            with open(self.session_handler.entities_cache_file, encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cache, dict) or cache.get('owner_id') != owner_id:
+            return {}
+        return cache.get('channels', {})
+
+    def _load_entity_cache(self, owner_id: int) -> dict:
+        """Return input peers of channels joined within ENTITIES_CACHE_TTL, keyed by channel"""
+        now = time.time()
+        return {
+            channel: InputPeerChannel(entry['channel_id'], entry['access_hash'])
+            for channel, entry in self._read_entity_cache(owner_id).items()
+            if now - entry.get('joined_at', 0) < self.ENTITIES_CACHE_TTL
+        }
+
+    def _save_entity_cache(self, owner_id: int, cached: dict, joined: dict):
+        """Write back still-valid entries plus the channels joined in this run"""
+        now = time.time()
+        entries = {c: e for c, e in self._read_entity_cache(owner_id).items() if c in cached}
+        for channel, entity in joined.items():
+            entries[channel] = {'channel_id': entity.id, 'access_hash': entity.access_hash, 'joined_at': now}
+        # Written to a temporary file and swapped in, so a crash never leaves a torn cache
+        path = self.session_handler.entities_cache_file
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'owner_id': owner_id, 'channels': entries}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write %s: %s", path, e)
+
+    async def join_channels(self):
+        """Join all configured channels and return their entities"""
+        # Bounded to stay under Telegram's flood limits
+        sem = asyncio.Semaphore(10)
+        # Channels are already stripped and filtered by ConfigValidator
+        channels = self.config['channels']
+
+        # Always one request, even when every channel is cached: it confirms the
+        # session is still authorized and names the account the cache belongs to
+        me = await call_with_flood_retry(self.client.get_me)
+        if me is None:
+            # get_me() reports a revoked session as None; let start() discard it
+            raise UnauthorizedError(None, "Session is no longer authorized")
+
+        # Channels joined recently need neither resolving nor joining again
+        cached = {c: peer for c, peer in self._load_entity_cache(me.id).items() if c in channels}
+        channels = [c for c in channels if c not in cached]
+        if cached:
+            logger.info("Using cached entities for %d channels", len(cached))
+        if not channels:
+            return list(cached.values())
+
+        # Resolve every channel to an input peer concurrently
+        results = await asyncio.gather(*[self._resolve_one(c, sem) for c in channels], return_exceptions=True)
+        peers = {}
+        for channel, result in zip(channels, results):
+            if isinstance(result, UnauthorizedError):
+                # The saved session was revoked; let start() discard it
+                raise result
+            if isinstance(result, Exception):
+                logger.error("Failed to process channel %s: %s", channel, result)
+            else:
+                peers[channel] = result
+        if not peers:
+            return list(cached.values())
+
+        # One GetChannels round-trip instead of a get_entity call per channel
+        entities = await self._fetch_channels(peers)
+
+        # The fetched Channel objects carry the account's membership (left=False
+        # when already joined), so JoinChannelRequest is only sent for the rest
+        to_join = {c: e for c, e in entities.items() if getattr(e, 'left', True)}
+        if len(to_join) < len(entities):
+            logger.info("Already a member of %d channels", len(entities) - len(to_join))
+        results = await asyncio.gather(*[self._join_one(c, e, sem) for c, e in to_join.items()])
+        joined = dict(zip(to_join, results))
+        self._save_entity_cache(me.id, cached, {
+            c: e for c, e in entities.items()
+            if joined.get(c, True) and getattr(e, 'access_hash', None) is not None
+        })
+        return list(cached.values()) + list(entities.values())
     
     async def setup_message_handler(self):
         """Setup the message event handler"""
@@ -133,28 +276,86 @@ class TelegramUIBot:
             logger.warning("No valid channels to monitor. Skipping message handler setup.")
             return
 
-        @self.client.on(events.NewMessage(chats=self.channel_entities))
+        # Bound once here so the per-event handler does no attribute lookups
+        enqueue = self._event_q.put_nowait
+
+        # Marked peer ids computed once from the joined entities
+        chat_ids = frozenset(utils.get_peer_id(e) for e in self.channel_entities)
+        contains_ui_keywords = self.message_processor.contains_ui_keywords
+
+        def is_monitored_job_post(event):
+            # Chat check first so the keyword regex only runs on monitored channels
+            # (NewMessage applies pattern= before chats=, i.e. to every message)
+            return event.chat_id in chat_ids and contains_ui_keywords(event.raw_text)
+
+        # Filtering runs inside Telethon's event filter, so off-topic messages
+        # never reach (or allocate) the handler coroutine
+        @self.client.on(events.NewMessage(func=is_monitored_job_post))
         async def message_handler(event):
-            try:
-                await self.message_processor.process_message(event, self.client)
-            except FloodWaitError as e:
-                logger.warning(f"Rate limited, waiting {e.seconds} seconds")
-                await asyncio.sleep(e.seconds)
-            except Exception as e:
-                logger.error(f"Error processing message: {e}")
+            # Hand off to the batch consumer so Telethon can dispatch the next update
+            enqueue(event)
         
         logger.info(f"Message handler setup for {len(self.channel_entities)} channels")
     
+    async def _batch_consumer(self):
+        """Drain queued events and process them in batches"""
+        loop = asyncio.get_running_loop()
+        batch = []
+        while True:
+            # Block for the first event, then collect until the batch is full or the interval elapses
+            batch.append(await self._event_q.get())
+            deadline = loop.time() + self.BATCH_INTERVAL
+            while len(batch) < self.MAX_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._event_q.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Process in the background so a slow batch does not hold up the next one;
+            # past MAX_INFLIGHT wait for a slot and let events accumulate in the queue
+            if len(self._pending) >= self.MAX_INFLIGHT:
+                await asyncio.wait(self._pending, return_when=asyncio.FIRST_COMPLETED)
+            task = asyncio.create_task(self._process_safe(batch))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+            batch = []
+    
+    async def _process_safe(self, batch):
+        """Process a batch of events, containing any error to that batch"""
+        # Flood waits are retried per message inside process_batch (see flood_control)
+        try:
+            await self.message_processor.process_batch(batch, self.client)
+        except Exception as e:
+            logger.error("Error processing message batch: %s", e)
+    
     async def start(self):
-        """Start the bot"""
+        """Start the bot.
+
+        Authorization goes only through client.start() with the UI bot callbacks;
+        SessionPasswordNeededError (2FA enabled) and AuthInputTimeout (no reply
+        to a login prompt) are caught here and stop startup.
+        """
         try:
             if not await self.initialize():
                 logger.error("Bot initialization failed")
                 return False
 
-            # Start and authorize the Telegram client using UI bot for phone & code
-            await self.client.start(phone=get_phone_number_from_bot, code_callback=get_code_from_bot)
-            logger.info("Telegram client started and authorized successfully")
+            if self.session_handler.has_valid_session():
+                # Saved session: connect directly, skipping client.start()'s authorization RPC
+                await self.client.connect()
+                logger.info("Telegram client connected using saved session")
+            else:
+                # Start and authorize the Telegram client using UI bot for phone & code
+                await self.client.start(phone=self._get_phone, code_callback=get_code_from_bot)
+                logger.info("Telegram client started and authorized successfully")
+                if not self.session_handler.uses_string_session:
+                    await self._share_string_session()
+            
+            # Upload the resume once up front instead of once per recipient
+            await self.message_processor.upload_resume(self.client)
             
             # Join channels
             self.channel_entities = await self.join_channels()
@@ -162,106 +363,144 @@ class TelegramUIBot:
 
             # Setup message handler for incoming messages in joined channels
             await self.setup_message_handler()
+            self._batch_task = asyncio.create_task(self._batch_consumer())
             
             self.is_running = True
             logger.info("Bot is now running and monitoring channels...")
             
-            # Keep the telethon client running until disconnected
-            await self.client.run_until_disconnected()
+            # Keep the telethon client running until disconnected or stop() is called
+            disconnected = asyncio.create_task(self.client.run_until_disconnected())
+            stop_requested = asyncio.create_task(self._shutdown_event.wait())
+            done, pending = await asyncio.wait(
+                {disconnected, stop_requested}, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in pending:
+                task.cancel()
+            if disconnected in done:
+                # Re-raise a dropped connection so the handlers below report it
+                disconnected.result()
             
+        except UnauthorizedError as e:
+            logger.error(f"Saved session is no longer authorized ({e}); removing it, restart to log in again")
+            self.session_handler.cleanup_session()
+            return False
         except SessionPasswordNeededError:
             logger.error("Two-factor authentication is enabled. Please disable it or implement get_password_from_bot.")
             return False
+        except AuthInputTimeout as e:
+            logger.error(f"Login aborted, the UI bot got no answer: {e}")
+            return False
         except Exception as e:
             logger.error(f"Critical error in Telegram client startup: {e}")
             return False
         finally:
             self.is_running = False
+            if self._batch_task:
+                self._batch_task.cancel()
+            for task in self._pending:
+                task.cancel()
             if self.client and self.client.is_connected():
                  await self.client.disconnect()
                  logger.info("Telethon client disconnected.")
-            # Remove signal handlers upon exit
-            signal.signal(signal.SIGINT, signal.SIG_DFL)
-            signal.signal(signal.SIGTERM, signal.SIG_DFL)
 
     
     async def stop(self):
         """Gracefully stop the bot"""
         if self.is_running and self.client and self.client.is_connected():
             self.is_running = False
+            self._shutdown_event.set()
             await self.client.disconnect()
             logger.info("Telethon client stopped gracefully")
-            # Note: UI bot (webhook) shutdown needs separate handling if not managed by updater.idle()
-            # For webhook, stopping the underlying http server would be needed.
-            # In this setup, the async sleep loop will just finish on task cancellation.
+            # The webhook server is stopped separately by _shutdown() in main
 
 async def main():
     """Main entry point"""
     # Load environment variables
-    load_dotenv()
-
-    # Get the event loop
-    loop = asyncio.get_event_loop()
+    env = get_config()
 
     # Setup Telegram bot webhook manually
-    bot_token = os.getenv("BOT_TOKEN")
-    render_url = os.getenv("RENDER_EXTERNAL_URL")
-    port = int(os.getenv("PORT"))
-    bot = TgBot(bot_token)
-    await bot.delete_webhook(drop_pending_updates=True)
-    await bot.set_webhook(url=render_url + "/webhook")
-
-    # Run Flask server in executor to handle webhook callbacks
-    flask_task = loop.run_in_executor(
-        None,
-        run_flask_app,
-        "0.0.0.0",
-        port
-    )
-
-    # Run Telethon bot
+    port = int(env.get("PORT"))
+    if not WEBHOOK_URL:
+        raise ValueError("Required environment variable RENDER_EXTERNAL_URL is missing")
+
+    # Only the update kinds the webhook handler reads are delivered
+    allowed_updates = ["message", "edited_message"]
+    request = HTTPXRequest(connection_pool_size=8, connect_timeout=10)
+    async with TgBot(BOT_TOKEN, request=request) as bot:
+        # Warm restarts usually find the webhook already registered; setWebhook
+        # (which replaces any existing webhook) is only sent when it differs.
+        # Pending updates are kept either way: one may be a login code the
+        # operator already sent
+        info = await bot.get_webhook_info()
+        if info.url == WEBHOOK_URL and set(info.allowed_updates or ()) == set(allowed_updates):
+            logger.info("Webhook already set to %s", WEBHOOK_URL)
+        else:
+            await bot.set_webhook(
+                url=WEBHOOK_URL,
+                drop_pending_updates=False,
+                allowed_updates=allowed_updates,
+            )
+
+    # Serve webhook callbacks on this event loop, alongside Telethon
+    server = create_webhook_server("0.0.0.0", port)
     telethon_bot = TelegramUIBot()
-    telethon_task = loop.create_task(telethon_bot.start())
 
-    # Wait for both Flask and Telethon to run indefinitely
-    await asyncio.gather(telethon_task, flask_task)
+    async def run_bot():
+        # The webhook server only exists to serve the Telethon bot, so once
+        # the bot finishes let the server drain and exit
+        try:
+            await telethon_bot.start()
+        finally:
+            server.should_exit = True
 
+    # An unexpected error in either task cancels the other and propagates from here
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(server.serve())
+            telethon_task = tg.create_task(run_bot())
 
-def shutdown_handler(signal_received, frame):
-    logger.info(f'Signal {signal_received} received. Initiating graceful shutdown.')
-    # Get the current event loop and stop it gracefully
-    loop = asyncio.get_event_loop()
-    # You might need a way to access the bot instance(s) here to call stop()
-    # For simplicity now, we rely on the main loop cancellation and finally blocks
-    # Or better, find the running tasks and cancel them:
-    for task in asyncio.all_tasks(loop=loop):
-        if task is not asyncio.current_task(loop=loop): # Don't cancel self
-             task.cancel()
-             logger.info(f"Cancelled task: {task.get_name() if hasattr(task, 'get_name') else task}")
+            # Shut down gracefully on SIGINT/SIGTERM via a coroutine scheduled on the loop
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(
+                    sig, lambda s=sig: _spawn_shutdown(s, telethon_bot, telethon_task, server)
+                )
+    finally:
+        # Release the UI bot's HTTP connection pool used for login prompts
+        await close_bot()
 
 
-if __name__ == '__main__':
-    # Setup signal handlers
-    signal.signal(signal.SIGINT, shutdown_handler)
-    signal.signal(signal.SIGTERM, shutdown_handler)
+# Strong references to in-flight shutdown tasks; the loop only keeps weak ones
+_shutdown_tasks = set()
+
+
+def _spawn_shutdown(sig, telethon_bot, telethon_task, server):
+    """Schedule _shutdown() from a signal handler and keep it alive until done"""
+    task = asyncio.create_task(_shutdown(sig, telethon_bot, telethon_task, server))
+    _shutdown_tasks.add(task)
+    task.add_done_callback(_shutdown_tasks.discard)
+
 
+async def _shutdown(sig, telethon_bot, telethon_task, server):
+    """Stop the webhook server and the Telethon bot so main()'s task group can exit"""
+    logger.info(f'Signal {sig.name} received. Initiating graceful shutdown.')
+    server.should_exit = True
+    if telethon_bot.is_running:
+        await telethon_bot.stop()
+    else:
+        # Still starting up (e.g. waiting for a login code), nothing to disconnect yet
+        telethon_task.cancel()
+
+
+if __name__ == '__main__':
     try:
-        # Get the current event loop or create a new one if none exists
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-             logger.warning("Event loop is already running.")
-             # If running in an environment like Jupyter, use run_until_complete
-             # loop.run_until_complete(main())
-             logger.error("Running in an unexpected async environment.")
-             # Depending on context, you might need to raise an error or adapt.
-             # For typical script execution, this block indicates an issue.
-        else:
-             # Otherwise, run the main coroutine
-             logger.info("Starting main asyncio loop.")
-             loop.run_until_complete(main())
+        logger.info("Starting main asyncio loop.")
+        asyncio.run(main())
 
     except KeyboardInterrupt:
         print("\nBot stopped by user (KeyboardInterrupt)")
+    except asyncio.CancelledError:
+        logger.info("Main loop cancelled by shutdown signal.")
     except Exception as e:
         print(f"Fatal error in __main__: {e}")
         logger.error(f"Fatal error in __main__ block: {e}")
@@ -1,14 +1,41 @@
+import io
 import os
 import re
 import asyncio
+import hashlib
 import logging
+from collections import OrderedDict
 from typing import Optional, List
 import google.generativeai as genai
 from telethon import TelegramClient
-from telethon.errors import FloodWaitError, UserPrivacyRestrictedError
+from telethon.errors import (
+    FileReferenceExpiredError, FloodWaitError, MediaEmptyError, UserPrivacyRestrictedError
+)
+from flood_control import call_with_flood_retry
 
 logger = logging.getLogger(__name__)
 
+# Patterns used on every incoming channel message, compiled once at import
+_USERNAME_RE = re.compile(r'@([a-zA-Z0-9_]+)')
+_PHONE_RE = re.compile(r'(\+98|0)?9\d{9}')
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+
+# genai.configure() sets the API key for the whole process and discards the
+# SDK's cached clients, so it runs once and every processor shares one model
+_gemini_model = None
+_gemini_api_key = None
+
+def _get_gemini_model(api_key: str):
+    """Return the process-wide Gemini model, configuring the SDK on first use"""
+    global _gemini_model, _gemini_api_key
+    if _gemini_model is None:
+        genai.configure(api_key=api_key)
+        _gemini_model = genai.GenerativeModel('gemini-pro')
+        _gemini_api_key = api_key
+    elif api_key != _gemini_api_key:
+        raise ValueError("Gemini is already configured with a different API key")
+    return _gemini_model
+
 class MessageProcessor:
     """Processes incoming messages and handles AI response generation"""
     
@@ -21,18 +48,28 @@ class MessageProcessor:
         'mobile design', 'app design', 'طراحی اپلیکیشن',
         'wireframe', 'prototype', 'mockup', 'طراحی موکاپ'
     ]
+    # Telegram's maximum caption length for media messages
+    CAPTION_LIMIT = 1024
+    # Number of generated replies kept for cross-posted job ads
+    GENERATED_CACHE_SIZE = 512
+    UI_KEYWORDS_RE = re.compile('|'.join(re.escape(k) for k in UI_KEYWORDS), re.IGNORECASE)
     
     def __init__(self, config):
         self.config = config
         self.processed_messages = set()  # To avoid duplicate processing
         self.rate_limit_delay = 30  # Seconds between messages to same user
         self.last_message_time = {}
+        self.generated_messages = OrderedDict()  # Text hash -> generated reply
+        self.resume_path, self.resume_bytes = self._load_resume_file()
+        self.resume_media = None  # Uploaded InputFile, then the sent Document once delivered
+        # Bound concurrent Gemini requests and outbound sends during channel bursts
+        self.gemini_semaphore = asyncio.Semaphore(5)
+        self.send_semaphore = asyncio.Semaphore(3)
         
         # Configure Gemini AI
         if self.config.get('gemini_api_key'):
             try:
-                genai.configure(api_key=self.config['gemini_api_key'])
-                self.model = genai.GenerativeModel('gemini-pro')
+                self.model = _get_gemini_model(self.config['gemini_api_key'])
             except Exception as e:
                 logger.error(f"Failed to configure Gemini AI: {e}")
                 self.model = None
@@ -42,13 +79,12 @@ class MessageProcessor:
     
     def contains_ui_keywords(self, text: str) -> bool:
         """Check if text contains UI/UX related keywords"""
-        text_lower = text.lower()
-        return any(keyword.lower() in text_lower for keyword in self.UI_KEYWORDS)
+        return self.UI_KEYWORDS_RE.search(text) is not None
     
     def extract_username(self, text: str) -> Optional[str]:
         """Extract username from text"""
         # Look for @username pattern
-        match = re.search(r'@([a-zA-Z0-9_]+)', text)
+        match = _USERNAME_RE.search(text)
         if match:
             return match.group(1)  # Return without @ symbol
         return None
@@ -63,12 +99,12 @@ class MessageProcessor:
             contact_info['username'] = username
         
         # Extract phone numbers (Iranian format)
-        phone_match = re.search(r'(\+98|0)?9\d{9}', text)
+        phone_match = _PHONE_RE.search(text)
         if phone_match:
             contact_info['phone'] = phone_match.group(0)
         
         # Extract email addresses
-        email_match = re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text)
+        email_match = _EMAIL_RE.search(text)
         if email_match:
             contact_info['email'] = email_match.group(0)
         
@@ -79,6 +115,14 @@ class MessageProcessor:
         if not self.model:
             return self._get_fallback_message()
         
+        # Reuse the reply generated for an identical (cross-posted) job ad
+        text_hash = hashlib.blake2b(job_text.encode(), digest_size=16).digest()
+        cached = self.generated_messages.get(text_hash)
+        if cached is not None:
+            self.generated_messages.move_to_end(text_hash)
+            logger.info("Reusing generated message for duplicate job posting")
+            return cached
+        
         prompt = f"""
 با توجه به آگهی استخدام زیر، یک پیام حرفه‌ای و دوستانه به زبان فارسی برای ارسال به کارفرما بنویس. پیام باید:
 
@@ -96,8 +140,13 @@ class MessageProcessor:
 """
         
         try:
-            response = await self.model.generate_content_async(prompt)
-            return response.text.strip()
+            async with self.gemini_semaphore:
+                response = await self.model.generate_content_async(prompt)
+            custom_message = response.text.strip()
+            self.generated_messages[text_hash] = custom_message
+            if len(self.generated_messages) > self.GENERATED_CACHE_SIZE:
+                self.generated_messages.popitem(last=False)
+            return custom_message
         except Exception as e:
             logger.error(f"Error generating AI response: {e}")
             return self._get_fallback_message()
@@ -134,12 +183,9 @@ class MessageProcessor:
                 logger.warning(f"User privacy restricted: {username}")
                 return False
             
-            # Send text message
-            await client.send_message(entity, message)
-            logger.info(f"Message sent to {username}")
-            
-            # Send resume file if available
-            await self._send_resume_file(client, entity, username)
+            async with self.send_semaphore:
+                # Send text message together with the resume file if available
+                await self._send_reply_with_resume(client, entity, username, message)
             
             # Update rate limiting tracker
             self.last_message_time[username] = current_time
@@ -152,8 +198,8 @@ class MessageProcessor:
             logger.error(f"Error sending message to {username}: {e}")
             return False
     
-    async def _send_resume_file(self, client: TelegramClient, entity, username: str):
-        """Send resume file to user"""
+    def _load_resume_file(self):
+        """Locate the resume file once and keep its contents in memory"""
         resume_filename = self.config.get('resume_filename', 'javad-rostami resume.pdf')
         
         # Try multiple possible paths for the resume file
@@ -164,61 +210,141 @@ class MessageProcessor:
             os.path.join(os.path.dirname(__file__), resume_filename)
         ]
         
-        resume_path = None
         for path in possible_paths:
             if os.path.exists(path):
-                resume_path = path
-                break
+                try:
+                    with open(path, 'rb') as f:
+                        return path, f.read()
+                except OSError as e:
+                    logger.error(f"Could not read resume file {path}: {e}")
+                    return None, None
         
+        logger.warning("Resume file not found at any of the expected paths")
+        return None, None
+    
+    async def upload_resume(self, client: TelegramClient):
+        """Upload the resume once so every recipient reuses the same file"""
+        if self.resume_bytes is None:
+            return
+        try:
+            self.resume_media = await call_with_flood_retry(lambda: client.upload_file(
+                self.resume_bytes, file_name=os.path.basename(self.resume_path)
+            ))
+            logger.info("Resume file uploaded")
+        except Exception as e:
+            logger.error(f"Could not pre-upload resume file: {e}")
+    
+    async def _send_reply_with_resume(self, client: TelegramClient, entity, username: str, message: str):
+        """Send the reply as the resume file caption so one request delivers both"""
         portfolio_url = self.config.get('portfolio_url', '')
+        portfolio_line = f"🎨 نمونه کارها: {portfolio_url}" if portfolio_url else None
         
-        if resume_path:
-            try:
-                caption = f"📄 رزومه و سوابق کاری\n🎨 نمونه کارها: {portfolio_url}"
-                await client.send_file(entity, resume_path, caption=caption)
-                logger.info(f"Resume file sent to {username}")
-            except Exception as e:
-                logger.error(f"Error sending resume file to {username}: {e}")
-                # Send portfolio link as text if file sending fails
-                if portfolio_url:
-                    await client.send_message(entity, f"🎨 نمونه کارها: {portfolio_url}")
-        else:
+        if self.resume_bytes is None:
             logger.warning(f"Resume file not found at any of the expected paths")
-            # Send portfolio link if resume file is not available
-            if portfolio_url:
-                await client.send_message(entity, f"🎨 نمونه کارها: {portfolio_url}")
+            # Send portfolio link along with the message if resume file is not available
+            await client.send_message(entity, "\n\n".join(filter(None, [message, portfolio_line])))
+            logger.info(f"Message sent to {username}")
+            return
+        
+        resume_caption = f"📄 رزومه و سوابق کاری\n🎨 نمونه کارها: {portfolio_url}"
+        caption = f"{message}\n\n{resume_caption}"
+        if len(caption) > self.CAPTION_LIMIT:
+            # Too long for a file caption, send the message on its own first
+            await client.send_message(entity, message)
+            logger.info(f"Message sent to {username}")
+            message = None
+            caption = resume_caption
+        
+        try:
+            def send_resume():
+                resume_file = self.resume_media
+                if resume_file is None:
+                    # A fresh stream per attempt; a retried upload must read from the start
+                    resume_file = io.BytesIO(self.resume_bytes)
+                    resume_file.name = os.path.basename(self.resume_path)
+                return client.send_file(entity, resume_file, caption=caption, force_document=True)
+            
+            # Retried here so a flood wait never resends the text already sent above
+            sent = await call_with_flood_retry(send_resume)
+            # Later sends reference the stored document instead of uploading again
+            if sent.document:
+                self.resume_media = sent.document
+            logger.info(f"Message and resume file sent to {username}")
+        except FloodWaitError:
+            if message is not None:
+                raise  # Nothing delivered yet; process_batch retries the whole reply
+            logger.error(f"Flood wait persisted, resume file not sent to {username}")
+        except Exception as e:
+            logger.error(f"Error sending resume file to {username}: {e}")
+            if isinstance(e, (FileReferenceExpiredError, MediaEmptyError)):
+                # The stored upload is no longer usable; the next send uploads afresh
+                self.resume_media = None
+            # Send message and portfolio link as text if file sending fails
+            fallback = "\n\n".join(filter(None, [message, portfolio_line]))
+            if fallback:
+                await client.send_message(entity, fallback)
+    
+    async def process_batch(self, events: List, client: TelegramClient):
+        """Process a batch of events, replying once to ads cross-posted within it"""
+        unique_events = []
+        seen_texts = set()
+        for event in events:
+            text = event.raw_text
+            if text in seen_texts:
+                continue
+            seen_texts.add(text)
+            unique_events.append(event)
+        
+        if len(unique_events) < len(events):
+            logger.info("Skipped %d duplicate messages in batch", len(events) - len(unique_events))
+        
+        # Regex extraction for the whole batch runs in one worker thread so it
+        # never holds up Telethon's update dispatch on the event loop
+        contacts = await asyncio.to_thread(
+            self._extract_contacts, [event.raw_text for event in unique_events]
+        )
+        
+        # Gemini and send concurrency is bounded by the processor's semaphores;
+        # a message hitting a flood wait is retried after the (clamped) wait
+        await asyncio.gather(*(
+            call_with_flood_retry(lambda event=event, info=info: self.process_message(event, client, info))
+            for event, info in zip(unique_events, contacts)
+            if info is not None
+        ))
+    
+    def _extract_contacts(self, texts: List[str]) -> List[Optional[dict]]:
+        """CPU-only pass over a batch: contact info per text, None for texts too short to be a job ad"""
+        return [
+            self.extract_contact_info(text) if text and len(text.strip()) >= 10 else None
+            for text in texts
+        ]
     
-    async def process_message(self, event, client: TelegramClient):
-        """Process incoming message and send response if relevant"""
+    async def process_message(self, event, client: TelegramClient, contact_info: dict):
+        """Process an incoming UI/UX job message and send response if relevant.
+        
+        contact_info comes from _extract_contacts, which has already dropped
+        empty and too-short messages.
+        """
         try:
-            message_text = event.message.message
+            message_text = event.raw_text
             message_id = event.message.id
             
             # Skip if already processed
             if message_id in self.processed_messages:
                 return
             
-            # Skip empty messages
-            if not message_text or len(message_text.strip()) < 10:
-                return
-            
-            logger.debug(f"Processing message: {message_text[:100]}...")
-            
-            # Check if message contains UI/UX keywords
-            if not self.contains_ui_keywords(message_text):
-                return
+            logger.debug("Processing message: %.100s...", message_text)
             
+            # UI/UX keyword filtering is done by the NewMessage pattern in setup_message_handler
             logger.info("UI/UX job posting detected")
             
-            # Extract contact information
-            contact_info = self.extract_contact_info(message_text)
             username = contact_info.get('username')
             
             if not username:
                 logger.info("No username found in message")
                 return
             
-            logger.info(f"Found username: {username}")
+            logger.info("Found username: %s", username)
             
             # Generate personalized response
             custom_message = await self.generate_custom_message(message_text)
@@ -236,5 +362,7 @@ class MessageProcessor:
                     # Keep only the last 500 messages
                     self.processed_messages = set(list(self.processed_messages)[-500:])
             
+        except FloodWaitError:
+            raise  # Retried by process_batch
         except Exception as e:
             logger.error(f"Error in process_message: {e}")
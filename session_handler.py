@@ -1,7 +1,10 @@
 import os
 import logging
+import sqlite3
+from contextlib import closing
 from typing import Dict, Any, Optional, Tuple
 from telethon import TelegramClient
+from telethon.sessions import StringSession
 from telethon.network import connection
 
 logger = logging.getLogger(__name__)
@@ -9,9 +12,31 @@ logger = logging.getLogger(__name__)
 class SessionHandler:
     """Handles Telegram session creation and proxy configuration"""
     
+    # Telethon sleeps through flood waits up to this many seconds itself, which
+    # covers calls that cannot be wrapped (e.g. send_code/sign_in inside
+    # client.start()); longer waits are raised and handled by
+    # flood_control.call_with_flood_retry at the call sites
+    FLOOD_SLEEP_THRESHOLD = 10
+    
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.session_name = 'telegram_ui_bot_session'
+        # Channel peers cached by TelegramUIBot.join_channels; access hashes are
+        # only valid for the account that resolved them
+        self.entities_cache_file = 'entities_cache.json'
+        # Telethon string session from TG_STRING_SESSION; when set, the session lives
+        # in memory and no SQLite file is opened or written on an ephemeral disk
+        self.string_session = config.get('tg_string_session')
+    
+    @property
+    def uses_string_session(self) -> bool:
+        return bool(self.string_session)
+    
+    def _get_session(self):
+        """Return the session to build the client with"""
+        if self.uses_string_session:
+            return StringSession(self.string_session)
+        return self.session_name
     
     async def create_client(self) -> TelegramClient:
         """Create and configure Telegram client with proxy if needed"""
@@ -20,17 +45,19 @@ class SessionHandler:
         if proxy_config:
             logger.info(f"Creating client with {proxy_config[0]} proxy: {proxy_config[1]}:{proxy_config[2]}")
             client = TelegramClient(
-                self.session_name,
+                self._get_session(),
                 self.config['api_id'],
                 self.config['api_hash'],
-                proxy=proxy_config
+                proxy=proxy_config,
+                flood_sleep_threshold=self.FLOOD_SLEEP_THRESHOLD
             )
         else:
             logger.info("Creating client without proxy")
             client = TelegramClient(
-                self.session_name,
+                self._get_session(),
                 self.config['api_id'],
-                self.config['api_hash']
+                self.config['api_hash'],
+                flood_sleep_threshold=self.FLOOD_SLEEP_THRESHOLD
             )
         
         return client
@@ -79,8 +106,36 @@ class SessionHandler:
             logger.error(f"Error configuring proxy: {e}")
             return None
     
+    def has_valid_session(self) -> bool:
+        """Check the session file for a stored auth key without connecting"""
+        if self.uses_string_session:
+            # A non-empty string session always carries an auth key
+            return True
+        session_file = f"{self.session_name}.session"
+        if not os.path.isfile(session_file):
+            return False
+        try:
+            with closing(sqlite3.connect(session_file)) as conn:
+                row = conn.execute("SELECT auth_key FROM sessions LIMIT 1").fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read session file: {e}")
+            return False
+        return bool(row and row[0])
+    
+    def export_string_session(self, client: TelegramClient) -> str:
+        """Serialize the client's current session for use as TG_STRING_SESSION"""
+        return StringSession.save(client.session)
+    
     def cleanup_session(self):
         """Clean up session files if needed"""
+        if os.path.exists(self.entities_cache_file):
+            try:
+                os.remove(self.entities_cache_file)
+            except OSError as e:
+                logger.warning(f"Could not remove {self.entities_cache_file}: {e}")
+        if self.uses_string_session:
+            logger.warning("Session comes from TG_STRING_SESSION; unset it to log in again")
+            return
         session_file = f"{self.session_name}.session"
         if os.path.exists(session_file):
             try:
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+from telethon.errors import FloodWaitError
+
+import flood_control
+from flood_control import call_with_flood_retry
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record requested sleeps instead of waiting"""
+    recorded = []
+
+    async def fake_sleep(seconds):
+        recorded.append(seconds)
+
+    monkeypatch.setattr(flood_control.asyncio, "sleep", fake_sleep)
+    return recorded
+
+
+def flood_then(results):
+    """Return a coroutine factory that raises/returns the given results in order"""
+    calls = iter(results)
+
+    async def call():
+        result = next(calls)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return call
+
+
+def test_returns_result_after_flood_waits(sleeps):
+    factory = flood_then([FloodWaitError(None, capture=3), FloodWaitError(None, capture=4), "ok"])
+    assert asyncio.run(call_with_flood_retry(factory)) == "ok"
+    assert sleeps == [3, 4]
+
+
+def test_gives_up_after_max_retries(sleeps):
+    factory = flood_then([FloodWaitError(None, capture=1)] * 4)
+    with pytest.raises(FloodWaitError):
+        asyncio.run(call_with_flood_retry(factory, max_retries=3))
+    assert sleeps == [1, 1, 1]
+
+
+def test_clamps_negative_and_long_waits(sleeps):
+    factory = flood_then([FloodWaitError(None, capture=-5), FloodWaitError(None, capture=86400), "ok"])
+    assert asyncio.run(call_with_flood_retry(factory, max_wait=600)) == "ok"
+    assert sleeps == [0, 600]
+
+
+def test_other_errors_are_not_retried(sleeps):
+    factory = flood_then([ValueError("boom"), "ok"])
+    with pytest.raises(ValueError):
+        asyncio.run(call_with_flood_retry(factory))
+    assert sleeps == []
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+import ui_bot_handler
+from ui_bot_handler import _parse_chat_id, resolve_pending_input
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("123456789", 123456789),
+    ("-1001234567890", -1001234567890),
+    (" 42 ", 42),
+    ('"42"', 42),
+    ("'42'", 42),
+])
+def test_parse_chat_id_accepts_numeric_ids(value, expected):
+    assert _parse_chat_id(value) == expected
+
+
+@pytest.mark.parametrize("value", [None, "", "@some_channel", "abc"])
+def test_parse_chat_id_rejects_missing_or_non_numeric(value):
+    assert _parse_chat_id(value) is None
+
+
+def test_resolve_pending_input_skips_stale_futures(monkeypatch):
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        stale, waiting = loop.create_future(), loop.create_future()
+        stale.cancel()
+        monkeypatch.setattr(ui_bot_handler, "_pending", {0: stale, 1: waiting})
+
+        assert resolve_pending_input("12345") is True
+        assert waiting.result() == "12345"
+        # Nothing left to deliver to
+        assert resolve_pending_input("again") is False
+
+    asyncio.run(scenario())
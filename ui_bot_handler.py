@@ -1,20 +1,66 @@
-import os
 import logging
+import itertools
+from typing import Dict, Optional
 from telegram import Bot
 import asyncio
+from config import get_config
 
 logger = logging.getLogger(__name__)
 
-# Use a global variable to store the user's response
-user_response = None
-response_event = asyncio.Event()
+# Read once at import; these are needed on every prompt and webhook update
+_env = get_config()
+BOT_TOKEN = _env.get('BOT_TOKEN')
+CHAT_ID = _env.get('CHAT_ID')
+
+# Compared against incoming webhook updates; parsed defensively because this
+# runs at import, before ConfigValidator gets a chance to report bad config
+def _parse_chat_id(value):
+    """Return CHAT_ID as an int, or None (logged) when it is missing or not numeric"""
+    if not value:
+        return None
+    try:
+        return int(value.strip().strip('"\''))
+    except ValueError:
+        logger.error(f"CHAT_ID must be a numeric chat id, got {value!r}; UI bot replies will be ignored")
+        return None
+
+ALLOWED_CHAT_ID_INT = _parse_chat_id(CHAT_ID)
+
+# Inputs awaiting a reply from the UI bot chat, keyed by prompt id (oldest first)
+_pending: Dict[int, asyncio.Future] = {}
+_prompt_ids = itertools.count()
+
+# How long a login prompt waits for the operator's reply
+INPUT_TIMEOUT = 300
+
+class AuthInputTimeout(Exception):
+    """Raised when the operator does not answer a login prompt within INPUT_TIMEOUT"""
+
+# One Bot (and its HTTP connection pool) shared by every prompt
+_bot: Optional[Bot] = None
+
+async def _get_bot(token: str) -> Bot:
+    """Return the shared Bot, creating and initializing it on first use"""
+    global _bot
+    if _bot is None or _bot.token != token:
+        await close_bot()
+        bot = Bot(token)
+        # Bot.shutdown() only closes the connection pool of an initialized bot
+        await bot.initialize()
+        _bot = bot
+    return _bot
+
+async def close_bot():
+    """Close the shared Bot's connection pool, if one was created"""
+    global _bot
+    if _bot is not None:
+        bot, _bot = _bot, None
+        await bot.shutdown()
 
 async def send_telegram_message(token: str, chat_id: str, message: str):
     """Sends a message to a specific chat ID using the provided bot token."""
     try:
-        bot = Bot(token)
-        # Note: Use bot.send_message directly without Updater for simple cases
-        # or integrate with an existing Updater/Dispatcher setup.
+        bot = await _get_bot(token)
         await bot.send_message(chat_id=chat_id, text=message)
         logger.info(f"Message sent to chat ID {chat_id}")
     except Exception as e:
@@ -22,65 +68,59 @@ async def send_telegram_message(token: str, chat_id: str, message: str):
 
 async def request_input_via_bot(token: str, chat_id: str, prompt: str) -> str:
     """Sends a prompt via bot and waits for the user's response."""
-    global user_response
-    global response_event
-
-    user_response = None
-    response_event.clear()
-
-    await send_telegram_message(token, chat_id, prompt)
-
-    logger.info(f"Waiting for user response to: {prompt}")
-    await response_event.wait() # Wait until the response_event is set
-
-    return user_response
-
-# Placeholder for handling incoming messages to the UI bot token.
-# This part needs to be implemented elsewhere to receive messages
-# from the user (via CHAT_ID) and update the `user_response` and
-# set the `response_event` accordingly.
-# Example handler structure:
-# async def handle_user_response(update, context):
-#     global user_response
-#     global response_event
-#     if str(update.effective_chat.id) == os.getenv('CHAT_ID'):
-#         user_response = update.message.text
-#         response_event.set()
-#         logger.info(f"Received user response: {user_response}")
-#     else:
-#         logger.warning(f"Received message from unexpected chat ID: {update.effective_chat.id}")
+    prompt_id = next(_prompt_ids)
+    fut = asyncio.get_running_loop().create_future()
+    _pending[prompt_id] = fut
+    try:
+        await send_telegram_message(token, chat_id, prompt)
+
+        logger.info(f"Waiting for user response to: {prompt}")
+        try:
+            return await asyncio.wait_for(fut, timeout=INPUT_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise AuthInputTimeout(f"No reply within {INPUT_TIMEOUT}s to: {prompt}") from None
+    finally:
+        _pending.pop(prompt_id, None)
+
+def resolve_pending_input(text: str) -> bool:
+    """Deliver a reply from the UI bot chat to the oldest waiting prompt."""
+    while _pending:
+        prompt_id = next(iter(_pending))
+        fut = _pending.pop(prompt_id)
+        if not fut.done():
+            fut.set_result(text)
+            return True
+    return False
+
+# Incoming messages to the UI bot token are received by the webhook in
+# webhook_app, which passes the user's reply (from CHAT_ID) to
+# resolve_pending_input().
 
 # Functions that telethon can call to get user input
 async def get_phone_number_from_bot():
-    token = os.getenv('BOT_TOKEN')
-    chat_id = os.getenv('CHAT_ID')
-    if not token or not chat_id:
+    if not BOT_TOKEN or not CHAT_ID:
         logger.error("BOT_TOKEN or CHAT_ID not found in environment variables.")
         raise ValueError("BOT_TOKEN or CHAT_ID not configured.")
 
     prompt = "لطفاً شماره تلفن خود را برای ورود به تلگرام وارد کنید:"
-    phone_number = await request_input_via_bot(token, chat_id, prompt)
+    phone_number = await request_input_via_bot(BOT_TOKEN, CHAT_ID, prompt)
     return phone_number
 
 async def get_code_from_bot():
-    token = os.getenv('BOT_TOKEN')
-    chat_id = os.getenv('CHAT_ID')
-    if not token or not chat_id:
+    if not BOT_TOKEN or not CHAT_ID:
         logger.error("BOT_TOKEN or CHAT_ID not found in environment variables.")
         raise ValueError("BOT_TOKEN or CHAT_ID not configured.")
 
     prompt = "لطفاً کد تاییدی که از تلگرام دریافت کرده‌اید را وارد کنید:"
-    code = await request_input_via_bot(token, chat_id, prompt)
+    code = await request_input_via_bot(BOT_TOKEN, CHAT_ID, prompt)
     return code
 
 # Optional: Function to handle 2FA password if enabled
 # async def get_password_from_bot():
-#     token = os.getenv('BOT_TOKEN')
-#     chat_id = os.getenv('CHAT_ID')
-#     if not token or not chat_id:
+#     if not BOT_TOKEN or not CHAT_ID:
 #         logger.error("BOT_TOKEN or CHAT_ID not found in environment variables.")
 #         raise ValueError("BOT_TOKEN or CHAT_ID not configured.")
 #
 #     prompt = "لطفاً رمز عبور دو مرحله‌ای تلگرام خود را وارد کنید:"
-#     password = await request_input_via_bot(token, chat_id, prompt)
+#     password = await request_input_via_bot(BOT_TOKEN, CHAT_ID, prompt)
 #     return password 
\ No newline at end of file
@@ -0,0 +1,73 @@
+import contextlib
+import logging
+import time
+import orjson
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+import ui_bot_handler
+from ui_bot_handler import ALLOWED_CHAT_ID_INT
+
+logger = logging.getLogger(__name__)
+
+# Pre-serialized acknowledgement returned for every webhook call
+_OK_BODY = b'{"ok":true}'
+
+# Messages from other chats are dropped without replying; the warning for
+# them is logged at most once per interval so spam cannot flood the log
+UNAUTHORIZED_LOG_INTERVAL = 60
+_last_unauthorized_log = float('-inf')
+
+def _ok() -> Response:
+    return Response(_OK_BODY, media_type="application/json")
+
+async def telegram_webhook(request: Request) -> Response:
+    data = orjson.loads(await request.body())
+    msg = data.get("message") or data.get("edited_message")
+    if not msg:
+        return _ok()
+
+    chat_id = msg["chat"]["id"]
+    if chat_id != ALLOWED_CHAT_ID_INT:
+        global _last_unauthorized_log
+        now = time.monotonic()
+        if now - _last_unauthorized_log >= UNAUTHORIZED_LOG_INTERVAL:
+            _last_unauthorized_log = now
+            logger.warning("Ignoring message from unauthorized chat ID: %s", chat_id)
+        return _ok()
+
+    text = msg.get("text", "")
+    # Hand the reply to the prompt waiting in ui_bot_handler
+    if ui_bot_handler.resolve_pending_input(text):
+        logger.info("UI bot received response: %s", text)
+    else:
+        logger.info("UI bot received message with no pending prompt: %s", text)
+    return _ok()
+
+
+app = Starlette(routes=[Route("/webhook", telegram_webhook, methods=["POST"])])
+
+
+class _EmbeddedServer(uvicorn.Server):
+    """uvicorn server that leaves SIGINT/SIGTERM to main()'s own handlers.
+
+    uvicorn < 0.29 replaces loop signal handlers in install_signal_handlers(),
+    and >= 0.29 re-raises captured signals after serve() returns; either would
+    bypass (or repeat) the shutdown that also stops the Telethon bot.
+    """
+
+    def install_signal_handlers(self) -> None:
+        pass
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+
+def create_webhook_server(host: str, port: int) -> uvicorn.Server:
+    """Build a uvicorn server whose serve() runs on the caller's event loop"""
+    logger.info(f"Starting webhook server on {host}:{port}")
+    config = uvicorn.Config(app, host=host, port=port, loop="asyncio", lifespan="off")
+    return _EmbeddedServer(config)